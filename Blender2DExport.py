@@ -1,8 +1,11 @@
 import bpy
 import os
+import re
 import math
+import concurrent.futures
 import mathutils
 import configparser
+import numpy as np
 
 #---------------------------------------------------------------------------------------------------------------
 # Troubleshooting:
@@ -12,14 +15,16 @@ import configparser
 #---------------------------------------------------------------------------------------------------------------
 
 OUTPUT_DIRECTORY = 'render'
+RENAME_WORKER_COUNT = 8		# Worker threads used when renaming lots of outputs (e.g. split_meshes on a network drive)
+RENAME_THREAD_THRESHOLD = 16	# Minimum number of renamed outputs before the renames are spread over worker threads
 
 #---------------------------------------------------------------------------------------------------------------
 
-output_names = {
+output_names = (
 	'depth',
 	'normal',
 	'diffuse'
-}
+)
 
 # Optional channels from the mesh material that should be output using AOVs
 # See https://docs.blender.org/manual/en/latest/render/shader_nodes/output/aov.html
@@ -30,6 +35,13 @@ optional_aov_name_dict = {
 	'Roughness' : 'roughness'
 }
 
+# The above never change while exporting, so freeze them once rather than building dict views in each loop
+optional_aovs = tuple(optional_aov_name_dict.items())
+optional_aov_output_names = tuple(optional_aov_name_dict.values())
+
+# Every output name that SanitizeFilenames needs to rename
+sanitized_output_names = output_names + optional_aov_output_names
+
 #---------------------------------------------------------------------------------------------------------------
 
 def ShowMessageBox(message = "", title = "Message Box", icon = 'INFO'):
@@ -39,8 +51,9 @@ def ShowMessageBox(message = "", title = "Message Box", icon = 'INFO'):
 
 #---------------------------------------------------------------------------------------------------------------
 
+# N.B. Uses integer bit_length rather than log2, which can round incorrectly at exact powers of 2
 def next_power_of_2(x):
-    return 1 if x == 0 else 2 ** math.ceil(math.log2(x))
+	return 1 if x <= 0 else 1 << (math.ceil(x) - 1).bit_length()
 
 #---------------------------------------------------------------------------------------------------------------
 
@@ -50,24 +63,26 @@ def next_power_of_2(x):
 #      I just don't want to piss away texel space for long, thin meshes
 def calculate_desired_resolution(target_resolution, dimension, shrink_smaller_axis = True):
 
-	# Calculate the x/y and y/x ratios of the mesh bounds	
-	ratio_x = dimension.x / dimension.y
-	ratio_y = dimension.y / dimension.x
+	# Fast path for (roughly) square meshes. Neither axis is a multiple of 2.0 of the other,
+	# so no fitting is required
+	if dimension.x < 2.0 * dimension.y and dimension.y < 2.0 * dimension.x:
+		resolution = next_power_of_2(target_resolution)
+		return resolution, resolution
 
 	# Calculate how many multiples of 2.0 each axis is, relative to the other axis
-	x_scale_multiplier = 1.0 + math.floor(ratio_x / 2.0)
-	y_scale_multiplier = 1.0 + math.floor(ratio_y / 2.0)
+	x_scale_multiplier = 1 + int(dimension.x / dimension.y // 2.0)
+	y_scale_multiplier = 1 + int(dimension.y / dimension.x // 2.0)
 
 	# Scale the requested resolution down by the multiplier values, ensuring that we
 	# always stay at a power of 2 to keep textures sensible
 	# N.B. This *shrinks* the smaller axis by default. 
 	# 	   Pass in False for shrink_smaller_axis in order to instead *grow* the larger axis
 	if shrink_smaller_axis:
-		resolution_x = next_power_of_2(target_resolution / int(y_scale_multiplier))
-		resolution_y = next_power_of_2(target_resolution / int(x_scale_multiplier))
+		resolution_x = next_power_of_2(target_resolution / y_scale_multiplier)
+		resolution_y = next_power_of_2(target_resolution / x_scale_multiplier)
 	else:
-		resolution_x = next_power_of_2(target_resolution * int(x_scale_multiplier))
-		resolution_y = next_power_of_2(target_resolution * int(y_scale_multiplier))
+		resolution_x = next_power_of_2(target_resolution * x_scale_multiplier)
+		resolution_y = next_power_of_2(target_resolution * y_scale_multiplier)
 
 	return resolution_x, resolution_y
 
@@ -81,38 +96,53 @@ class RenderParameters:
 	brightness_boost= 0.0
 	contrast_boost= 0.0
 	split_meshes = False						# Render each mesh individually, using the combined bounds of all meshes
+	split_meshes_single_render = False			# Produce the split_meshes outputs from one render, masking each mesh with Cryptomatte
 	shrink_resolution_when_fitting = True	    # Whether rectangular fitting should increase resolution to fit a longer axis, or shrink the resolution of the smaller axis
 	camera_min_distance = 0.0
 	camera_max_distance = 0.0
 	output_path = ""
 
-def RenderScene():
-
+# Reads the optional render.cfg next to the .blend file.
+# Any values missing from the config keep their defaults
+def ReadRenderConfig(config_path):
 	render_params = RenderParameters()
 
+	config = configparser.ConfigParser()
+	config.read(config_path)
+	config_section = config['DEFAULT']
+
+	render_params.xy_padding = config_section.getfloat('xy_padding', 0.1)
+	render_params.z_padding = config_section.getfloat('z_padding', 0.0)
+	render_params.resolution = config_section.getint('resolution', 512)
+	render_params.camera_height = config_section.getfloat('camera_height', 100)
+	render_params.brightness_boost = config_section.getfloat('brightness_boost', 0.0)
+	render_params.contrast_boost = config_section.getfloat('contrast_boost', 0.0)
+	render_params.split_meshes = config_section.getboolean('split_meshes', False)
+	render_params.split_meshes_single_render = config_section.getboolean('split_meshes_single_render', False)
+	render_params.shrink_resolution_when_fitting = config_section.getboolean('shrink_resolution_when_fitting', True)
+
+	return render_params
+
+def RenderScene():
+
 	# Build some paths for later
 	directory_name = os.path.dirname(bpy.context.blend_data.filepath)
 	config_path = os.path.join(directory_name, 'render.cfg')
-	render_params.output_path = os.path.join(directory_name, OUTPUT_DIRECTORY )
 
 	# Read config
-	config = configparser.ConfigParser()
-	config.read(config_path)
-
-	render_params.xy_padding = float(config.get('DEFAULT', 'xy_padding', fallback = 0.1))
-	render_params.z_padding = float(config.get('DEFAULT', 'z_padding', fallback = 0.0))
-	render_params.resolution = int(config.get('DEFAULT', 'resolution', fallback = 512))
-	render_params.camera_height = float(config.get('DEFAULT', 'camera_height', fallback = 100))
-	render_params.brightness_boost = float(config.get('DEFAULT', 'brightness_boost', fallback = 0.0))
-	render_params.contrast_boost = float(config.get('DEFAULT', 'contrast_boost', fallback = 0.0))
-	render_params.split_meshes = config.getboolean('DEFAULT', 'split_meshes', fallback = False)
-	render_params.shrink_resolution_when_fitting = config.getboolean('DEFAULT', 'shrink_resolution_when_fitting', fallback = True)
+	render_params = ReadRenderConfig(config_path)
+	render_params.output_path = os.path.join(directory_name, OUTPUT_DIRECTORY )
 		
 	# Cache a scene reference for ease
 	scene = bpy.context.scene
 
+	# Gather the scene meshes once, rather than filtering bpy.data.objects every time they are needed
+	# N.B. Viewport visibility is not changed by the export, so it is safe to cache too
+	mesh_objects = [scene_object for scene_object in bpy.data.objects if scene_object.type == 'MESH']
+	visible_mesh_objects = [scene_object for scene_object in mesh_objects if scene_object.visible_get()]
+
 	# Calculate the bounds of scene objects
-	min_bounds, max_bounds = GetSceneBounds()
+	min_bounds, max_bounds = GetSceneBounds(visible_mesh_objects)
 	dimension = max_bounds - min_bounds
 	max_xy_dimension = max(dimension.x, dimension.y)
 	center = min_bounds + (dimension/ 2.0)
@@ -155,9 +185,13 @@ def RenderScene():
 		view_layer.use_pass_normal = True
 		view_layer.use_pass_z = True
 		view_layer.use_pass_ambient_occlusion = True
+
+		# Object Cryptomatte is only needed to split meshes from a single render, otherwise leave the user's setting alone
+		if render_params.split_meshes and render_params.split_meshes_single_render:
+			view_layer.use_pass_cryptomatte_object = True
 		
 		# Create any new AOVs that may be missing
-		for _, aov_name in optional_aov_name_dict.items():
+		for aov_name in optional_aov_output_names:
 			aov_output_exists = False
 
 			# Check whether the AOV already exists
@@ -184,35 +218,68 @@ def RenderScene():
 	# This is useful for assembling multi-part meshes that don't require hand-fitting back together in Unity
 	# It does however require that meshes are individually hidden/shown, and requires a mesh prefix to be added to filenames.
 	# This means we pass a render_prefix string all over the place (empty string if split_meshes is False)
-	if render_params.split_meshes:
+	# The compositor graph is identical for every mesh, so build it once and only update the output prefix per render
+	compositor = build_compositor(render_params, visible_mesh_objects)
+
+	if render_params.split_meshes and render_params.split_meshes_single_render:
+		# Render all meshes once and split them apart in the compositor using their Cryptomatte mattes.
+		# N.B. Unlike the per-mesh renders below, any part of a mesh hidden behind another mesh will be missing
+		mesh_names = [scene_object.name for scene_object in mesh_objects]
+		set_split_outputs(compositor, mesh_names)
+
+		# Like the per-mesh renders, every mesh is output regardless of hide_render.
+		# Temporarily show any render-hidden meshes so their mattes aren't empty, then restore them
+		render_hidden_objects = [scene_object for scene_object in mesh_objects if scene_object.hide_render]
+		for scene_object in render_hidden_objects:
+			scene_object.hide_render = False
+
+		# Restore the hidden meshes even if the render fails, so the user's render visibility isn't lost
+		try:
+			bpy.ops.render.render()
+		finally:
+			for scene_object in render_hidden_objects:
+				scene_object.hide_render = True
+
+		SanitizeFilenames(render_params.output_path, [mesh_name + "_" for mesh_name in mesh_names])
+	elif render_params.split_meshes:
+		# N.B. Every hide_render write tags the depsgraph for a re-sync on the next render,
+		#      so only write it where the value actually changes
+
 		# Hide all meshes initially
-		for scene_object in bpy.data.objects:
-			if scene_object.type == 'MESH':
+		for scene_object in mesh_objects:
+			if not scene_object.hide_render:
 				scene_object.hide_render  = True
 
 		# - Iterate all meshes
-		# - Set them visible to rendering
+		# - Hide the previously rendered mesh and set the current mesh visible to rendering
 		# - Create a prefix ID with the mesh name, to identify the render output
 		# - Render
-		# - Sanitize the rendered image filenames to get rid of Blender cruft
-		# - Hide the mesh again
-		for scene_object in bpy.data.objects:
-			if scene_object.type == 'MESH':
-				scene_object.hide_render = False
-				render_prefix = scene_object.name + "_"
-				render(render_prefix, render_params)
-				bpy.ops.render.render()
-				SanitizeFilenames(render_params.output_path, render_prefix)
-				scene_object.hide_render = True
+		# Once all meshes are rendered, sanitize the rendered image filenames to get rid of Blender cruft
+		render_prefixes = []
+		previous_object = None
+		for scene_object in mesh_objects:
+			if previous_object is not None:
+				previous_object.hide_render = True
+			scene_object.hide_render = False
+			previous_object = scene_object
+
+			render_prefix = scene_object.name + "_"
+			set_output_prefix(compositor, render_prefix)
+			bpy.ops.render.render()
+			render_prefixes.append(render_prefix)
+
+		SanitizeFilenames(render_params.output_path, render_prefixes)
 
 		# Set all meshes visible again
-		for scene_object in bpy.data.objects:
-			if scene_object.type == 'MESH':
+		# N.B. The last rendered mesh is already visible
+		for scene_object in mesh_objects:
+			if scene_object.hide_render:
 				scene_object.hide_render = False
 	else:
 		# Non-split mesh (most commonly used). Just render all meshes in one pass, with no prefix
-		render("", render_params)
-		SanitizeFilenames(render_params.output_path, "")
+		set_output_prefix(compositor, "")
+		bpy.ops.render.render()
+		SanitizeFilenames(render_params.output_path, [""])
 
 	# Open an explorer window to the renders
 	folder_to_open = render_params.output_path
@@ -221,8 +288,19 @@ def RenderScene():
 
 #---------------------------------------------------------------------------------------------------------------
 
-def render(render_prefix, render_params):
+# References to the compositor nodes that feed the file-output node.
+# Kept around so the output prefix can be changed without rebuilding the graph
+class CompositorNodes:
+	output_node = None
+	render_layer_node = None
+	depth_remap_node = None
+	set_alpha_node = None
+	normal_gamma_node = None
+	aov_names = []						# AOVs found in the mesh shading graphs that need a file-output slot
+
+def build_compositor(render_params, visible_mesh_objects):
 	scene = bpy.context.scene
+	compositor = CompositorNodes()
 
 	# Set up the compositing node-tree
 	scene.use_nodes = True
@@ -237,36 +315,22 @@ def render(render_prefix, render_params):
 	render_layer_node.location = -100, 0
 
 	# Create a file-output node to write the render outputs to disk
+	# N.B. The output slots are created by set_output_prefix, as they depend on the render prefix
 	output_node = bpy.types.CompositorNodeOutputFile(tree.nodes.new(type = 'CompositorNodeOutputFile'))
 	output_node.location = 1300, 0
 	output_node.label = 'Outputs'
 	output_node.base_path = render_params.output_path 
 	output_node.format.color_depth = '16'
 
-	# Clear the file-output slots
-	output_node.layer_slots.clear()
-
-	# Add a new slot for each file-output type and link it to the relevant render-layer node
-	for output_name in output_names:
-		output_node.layer_slots.new(render_prefix + output_name)
-
 	# Add a node to remap the z range of the depth target
+	# N.B. The target range is reversed so the depth is inverted as part of the remap (nearest = 1.0)
 	depth_remap_node = bpy.types.CompositorNodeMapRange(tree.nodes.new(type = 'CompositorNodeMapRange'))
 	depth_remap_node.location = 600, 130 
 	depth_remap_node.inputs[1].default_value = render_params.camera_min_distance
 	depth_remap_node.inputs[2].default_value = render_params.camera_max_distance
-	depth_remap_node.inputs[3].default_value = 0.0
-	depth_remap_node.inputs[4].default_value = 1.0
+	depth_remap_node.inputs[3].default_value = 1.0
+	depth_remap_node.inputs[4].default_value = 0.0
 	tree.links.new(render_layer_node.outputs['Depth'], depth_remap_node.inputs[0])
-	
-	# Invert depth
-	depth_invert_node = bpy.types.CompositorNodeMath(tree.nodes.new(type = 'CompositorNodeMath'))
-	depth_invert_node.location = 800, 130 
-	depth_invert_node.operation = 'SUBTRACT'
-	depth_invert_node.inputs[0].default_value = 1.0
-
-	tree.links.new(depth_remap_node.outputs[0], depth_invert_node.inputs[1])
-	tree.links.new(depth_invert_node.outputs[0], output_node.inputs[render_prefix + 'depth'])
 
 	# Add a node to handle any brightness increase
 	brightness_node = bpy.types.CompositorNodeBrightContrast(tree.nodes.new(type = 'CompositorNodeBrightContrast'))
@@ -288,125 +352,212 @@ def render(render_prefix, render_params):
 
 	tree.links.new(ao_mix_node.outputs[0], set_alpha_node.inputs[0])                # Link AO mix to the Set Alpha 
 	tree.links.new(render_layer_node.outputs['Alpha'], set_alpha_node.inputs[1])    # Link the alpha render layer to Set Alpha
-	tree.links.new(set_alpha_node.outputs[0], output_node.inputs[render_prefix + 'diffuse'])        # Link set Alpha to the output diffuse color
 
 	# Add nodes to remap normal from[-1.0, 1.0] to [0.0, 1.0] and adjust gamma to have linear normals
-	normal_add_node = bpy.types.CompositorNodeMixRGB(tree.nodes.new(type = 'CompositorNodeMixRGB'))
-	normal_add_node.location = 350, -400 
-	normal_add_node.blend_type = 'ADD'
-	normal_add_node.inputs[2].default_value = (1.0, 1.0, 1.0, 1.0)
-	tree.links.new(render_layer_node.outputs['Normal'], normal_add_node.inputs[1])
-
-	normal_multiply_node = bpy.types.CompositorNodeMixRGB(tree.nodes.new(type = 'CompositorNodeMixRGB'))
-	normal_multiply_node.location = 550, -400 
-	normal_multiply_node.blend_type = 'MULTIPLY'
-	normal_multiply_node.inputs[2].default_value = (0.5, 0.5, 0.5, 0.5)
-	tree.links.new(normal_add_node.outputs[0], normal_multiply_node.inputs[1])
+	# N.B. A 50% mix with white is (N + 1.0) * 0.5, so the remap only needs a single node
+	normal_remap_node = bpy.types.CompositorNodeMixRGB(tree.nodes.new(type = 'CompositorNodeMixRGB'))
+	normal_remap_node.location = 550, -400 
+	normal_remap_node.blend_type = 'MIX'
+	normal_remap_node.inputs[0].default_value = 0.5
+	normal_remap_node.inputs[2].default_value = (1.0, 1.0, 1.0, 1.0)
+	tree.links.new(render_layer_node.outputs['Normal'], normal_remap_node.inputs[1])
 
 	normal_gamma_node = bpy.types.CompositorNodeGamma(tree.nodes.new(type = 'CompositorNodeGamma'))
 	normal_gamma_node.location = 750, -400 
 	normal_gamma_node.inputs[1].default_value = 2.2
 
-	tree.links.new(normal_multiply_node.outputs[0], normal_gamma_node.inputs[0])
-	tree.links.new(normal_gamma_node.outputs[0], output_node.inputs[render_prefix + 'normal'])
+	tree.links.new(normal_remap_node.outputs[0], normal_gamma_node.inputs[0])
 
 	# Material properties are not available as render-layers in Cycles, so the script can 
 	# use AOVs (Arbitrary Output Variables) to forward material properties to the renderer output
 	#
 	# This checks whether the optional material properties are connected in each meshes shading graph.
-	# If a property is hooked up (e.g. Roughness), then an additional link is made from the property input
-	# to an AOV output with a matching name.
+	# If a property is hooked up (e.g. Roughness), then an AOV output with a matching name is created in the shading graph.
 	# That AOV output is then picked up in the compositor and output along with the other render outputs
-	for bsdf_name, aov_name in optional_aov_name_dict.items():
-		aov_required = CreateShadingAOVIfRequired(bsdf_name, aov_name)
+	aov_names = []
+	for bsdf_name, aov_name in optional_aovs:
+		aov_required = CreateShadingAOVIfRequired(visible_mesh_objects, bsdf_name, aov_name)
 		if aov_required:
-			output_node.layer_slots.new(render_prefix + aov_name)
-			tree.links.new(render_layer_node.outputs[aov_name], output_node.inputs[render_prefix + aov_name])
+			aov_names.append(aov_name)
 
-	# Render
-	bpy.ops.render.render()
+	compositor.output_node = output_node
+	compositor.render_layer_node = render_layer_node
+	compositor.depth_remap_node = depth_remap_node
+	compositor.set_alpha_node = set_alpha_node
+	compositor.normal_gamma_node = normal_gamma_node
+	compositor.aov_names = aov_names
+
+	return compositor
 
 #---------------------------------------------------------------------------------------------------------------
 
-def SanitizeFilenames(render_directory, render_prefix):
+# Returns the (output name, socket) pairs that should be written to disk by the file-output node
+def get_output_sockets(compositor):
+	# The end of the compositor chain for each of the standard outputs
+	chain_end_sockets = {
+		'depth' : compositor.depth_remap_node.outputs[0],
+		'normal' : compositor.normal_gamma_node.outputs[0],
+		'diffuse' : compositor.set_alpha_node.outputs[0]
+	}
+
+	# Keyed on output_names, so the slots are always created in the same order as the names used to sanitize them
+	output_sockets = [(output_name, chain_end_sockets[output_name]) for output_name in output_names]
+
+	# Any required AOVs are forwarded straight from the render-layer node
+	for aov_name in compositor.aov_names:
+		output_sockets.append((aov_name, compositor.render_layer_node.outputs[aov_name]))
+
+	return output_sockets
+
+#---------------------------------------------------------------------------------------------------------------
+
+# Recreates the file-output slots using the given prefix and links them back up to the existing compositor nodes
+def set_output_prefix(compositor, render_prefix):
+	tree = bpy.context.scene.node_tree
+	output_node = compositor.output_node
+
+	# Clear the file-output slots
+	output_node.layer_slots.clear()
+
+	# Add a new slot for each file-output type and link it to the end of its compositor chain
+	for output_name, output_socket in get_output_sockets(compositor):
+		output_node.layer_slots.new(render_prefix + output_name)
+		tree.links.new(output_socket, output_node.inputs[render_prefix + output_name])
+
+#---------------------------------------------------------------------------------------------------------------
+
+# Creates a set of file-output slots per mesh, so split_meshes can be written from a single render.
+# Each mesh gets a Cryptomatte node to extract its matte, which is then used as the alpha for every output
+def set_split_outputs(compositor, mesh_names):
+	scene = bpy.context.scene
+	tree = scene.node_tree
+	output_node = compositor.output_node
+	output_sockets = get_output_sockets(compositor)
+
+	# Clear the file-output slots
+	output_node.layer_slots.clear()
+
+	for mesh_index, mesh_name in enumerate(mesh_names):
+		render_prefix = mesh_name + "_"
+		node_y = -600 - (mesh_index * 400)
+
+		# Pick the mesh out of the render's object Cryptomatte layer
+		cryptomatte_node = bpy.types.CompositorNodeCryptomatteV2(tree.nodes.new(type = 'CompositorNodeCryptomatteV2'))
+		cryptomatte_node.location = 800, node_y
+		cryptomatte_node.source = 'RENDER'
+		cryptomatte_node.scene = scene
+		cryptomatte_node.layer_name = compositor.render_layer_node.layer + '.CryptoObject'
+		# N.B. matte_id is parsed as a comma-separated list of names, so a mesh with a comma in its name
+		#      will not be matched and gets empty outputs. Rename such meshes, or use the per-mesh renders
+		cryptomatte_node.matte_id = mesh_name
+
+		for output_index, (output_name, output_socket) in enumerate(output_sockets):
+			# Mask the output by the mesh matte
+			mesh_alpha_node = bpy.types.CompositorNodeSetAlpha(tree.nodes.new(type = 'CompositorNodeSetAlpha'))
+			mesh_alpha_node.location = 1050, node_y - (output_index * 80)
+			mesh_alpha_node.hide = True
+			tree.links.new(output_socket, mesh_alpha_node.inputs[0])
+			tree.links.new(cryptomatte_node.outputs['Matte'], mesh_alpha_node.inputs[1])
+
+			output_node.layer_slots.new(render_prefix + output_name)
+			tree.links.new(mesh_alpha_node.outputs[0], output_node.inputs[render_prefix + output_name])
+
+#---------------------------------------------------------------------------------------------------------------
+
+def SanitizeFilenames(render_directory, render_prefixes):
+	# Nothing was rendered, and an empty prefix alternation would match every un-prefixed output
+	if len(render_prefixes) == 0:
+		return
+
 	filename =   os.path.splitext(bpy.path.basename(bpy.context.blend_data.filepath))[0] 
-	files = os.listdir(render_directory)
 
-	# Iterate over created textures removing the annoying 0001/0000 frame suffixes Blender adds
+	# Match the raw file-output names, e.g. "<prefix>depth0001.png", capturing the prefix and output name.
+	# Covers every prefix, the standard outputs and the AOV outputs so the directory is only scanned once
+	output_pattern = re.compile('^(' + '|'.join(map(re.escape, render_prefixes)) + ')(' + '|'.join(map(re.escape, sanitized_output_names)) + r')\d*\.png$')
+
+	# Gather the renames up front, removing the annoying 0001/0000 frame suffixes Blender adds
 	# Also prepends the textures with the Blender filename
-	for output in output_names:
-		for file in files:
-			if file.startswith(render_prefix + output):
-				old_path = os.path.join(render_directory, file)
-				new_path = os.path.join(render_directory, render_prefix + filename + '_' + output + '.png')
-				os.replace(old_path, new_path)
-
-	# TODO: Just append output_names and the AOV values, then run this loop once
-	for _, output in optional_aov_name_dict.items():
-		for file in files:
-			if file.startswith(render_prefix + output):
-				old_path = os.path.join(render_directory, file)
-				new_path = os.path.join(render_directory, render_prefix + filename + '_' + output + '.png')
-				os.replace(old_path, new_path)
+	# N.B. Renames are grouped by their target, so renames onto the same file run one after another on a single
+	#      worker rather than racing. Which frame ends up as the final file depends on the directory order, as before
+	renames = {}
+	with os.scandir(render_directory) as entries:
+		for entry in entries:
+			match = output_pattern.match(entry.name)
+			if match is not None:
+				new_path = os.path.join(render_directory, match.group(1) + filename + '_' + match.group(2) + '.png')
+				renames.setdefault(new_path, []).append(entry.path)
+
+	def rename_to(new_path):
+		for old_path in renames[new_path]:
+			os.replace(old_path, new_path)
+
+	# The usual handful of outputs is renamed directly. Large split_meshes exports spread the
+	# independent, I/O bound renames over a few threads, which helps on slow network drives
+	if len(renames) < RENAME_THREAD_THRESHOLD:
+		for new_path in renames:
+			rename_to(new_path)
+	else:
+		with concurrent.futures.ThreadPoolExecutor(max_workers = RENAME_WORKER_COUNT) as executor:
+			# Consume the results so any failed rename is raised here
+			list(executor.map(rename_to, renames))
 
 #---------------------------------------------------------------------------------------------------------------
 
-def GetSceneBounds():
+def GetSceneBounds(visible_mesh_objects):
 	MAX_BOUND = 100000.0
 
-	min_bounds = mathutils.Vector((MAX_BOUND, MAX_BOUND, MAX_BOUND))
-	max_bounds = mathutils.Vector((-MAX_BOUND, -MAX_BOUND, -MAX_BOUND))
+	min_bounds = np.full(3, MAX_BOUND)
+	max_bounds = np.full(3, -MAX_BOUND)
 	
 	# Iterate all visible scene meshes and adjust the min/max accordingly
-	for scene_object in bpy.data.objects:
-		if scene_object.type == 'MESH' and scene_object.visible_get():
-			bbox_corners = [scene_object.matrix_world @ mathutils.Vector(corner) for corner in scene_object.bound_box]
-			
-			for corner in bbox_corners:
-				min_bounds.x = min(min_bounds.x, corner.x)
-				min_bounds.y = min(min_bounds.y, corner.y)
-				min_bounds.z = min(min_bounds.z, corner.z)
-				max_bounds.x = max(max_bounds.x, corner.x)
-				max_bounds.y = max(max_bounds.y, corner.y)
-				max_bounds.z = max(max_bounds.z, corner.z)
+	# N.B. The corners are read in bulk and transformed with NumPy, rather than building
+	#      a mathutils.Vector per corner and comparing each component in Python
+	for scene_object in visible_mesh_objects:
+		corners = np.array(scene_object.bound_box, dtype = np.float64)		# The 8 local-space bounding box corners, as an 8x3 array
+		matrix_world = np.array(scene_object.matrix_world)
+		world_corners = corners @ matrix_world[:3, :3].T + matrix_world[:3, 3]
+
+		min_bounds = np.minimum(min_bounds, world_corners.min(axis = 0))
+		max_bounds = np.maximum(max_bounds, world_corners.max(axis = 0))
+
+	min_bounds = mathutils.Vector(min_bounds)
+	max_bounds = mathutils.Vector(max_bounds)
 	
 	return min_bounds, max_bounds
 
 #---------------------------------------------------------------------------------------------------------------
 
-def CreateShadingAOVIfRequired(bsdf_name, aov_name):
+def CreateShadingAOVIfRequired(visible_mesh_objects, bsdf_name, aov_name):
 	aov_required = False
 
 	# Iterate all visible meshes
-	for scene_object in bpy.data.objects:
-		if scene_object.type == 'MESH' and scene_object.visible_get():
-
-			# Grab their shading tree and have a look at the Principled BSDF node, if present
-			tree = scene_object.material_slots[0].material.node_tree
-			bsdf_node = tree.nodes.get("Principled BSDF")
-			if bsdf_node is not None:
-
-				# Check the input for the requested AOV, using the specified BSDF name
-				aov_input = bsdf_node.inputs[bsdf_name]
-				if aov_input is not None and len(aov_input.links) > 0:
-
-					# The property is linked, so an AOV is required
-					aov_required = True
-
-					# Search for an existing link to a valid AOV output node
-					source_node = aov_input.links[0].from_node
-					aov_exists = False
-					for output_node in source_node.outputs:
-						for link in output_node.links:
-							to_node = link.to_node
-							if type(to_node) is bpy.types.ShaderNodeOutputAOV and to_node.name == aov_name:
-								aov_exists = True
-					
-					# If no AOV exists, then create one
-					if not aov_exists:
-						new_aov_node = bpy.types.ShaderNodeOutputAOV(tree.nodes.new(type = 'ShaderNodeOutputAOV'))
-						new_aov_node.name = aov_name
-						tree.links.new(source_node.outputs[0], new_aov_node.inputs[0])
+	for scene_object in visible_mesh_objects:
+		# Grab their shading tree and have a look at the Principled BSDF node, if present
+		tree = scene_object.material_slots[0].material.node_tree
+		bsdf_node = tree.nodes.get("Principled BSDF")
+		if bsdf_node is not None:
+
+			# Check the input for the requested AOV, using the specified BSDF name
+			aov_input = bsdf_node.inputs[bsdf_name]
+			if aov_input is not None and len(aov_input.links) > 0:
+
+				# The property is linked, so an AOV is required
+				aov_required = True
+
+				# Search for an existing link to a valid AOV output node
+				source_node = aov_input.links[0].from_node
+				aov_exists = False
+				for output_node in source_node.outputs:
+					for link in output_node.links:
+						to_node = link.to_node
+						if type(to_node) is bpy.types.ShaderNodeOutputAOV and to_node.name == aov_name:
+							aov_exists = True
+				
+				# If no AOV exists, then create one
+				if not aov_exists:
+					new_aov_node = bpy.types.ShaderNodeOutputAOV(tree.nodes.new(type = 'ShaderNodeOutputAOV'))
+					new_aov_node.name = aov_name
+					tree.links.new(source_node.outputs[0], new_aov_node.inputs[0])
 
 	return aov_required
 